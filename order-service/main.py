@@ -2,9 +2,11 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Dict
 from datetime import datetime
+import itertools
 import logging
 import random
 import threading
+import time
 
 # ----------------------------
 # Azure Application Insights logging setup
@@ -74,22 +76,37 @@ class Order(BaseModel):
 # In-memory "database"
 # ----------------------------
 
-orders_db: Dict[str, Order] = {}
+# Orders are stored as plain dicts (model_dump() at write time). Writes
+# already validate via OrderCreate/Order, so reads can skip the second
+# Pydantic validation pass entirely.
+orders_db: Dict[str, dict] = {}
+
+# Process-local sequence appended to order ids; the old second-resolution
+# timestamp ids collided silently for concurrent POSTs.
+_order_seq = itertools.count()
+
+
+def new_order_id(prefix: str = "ORD") -> tuple[str, str]:
+    """Build a collision-free order id and created_at from one clock read."""
+    ns = time.time_ns()
+    order_id = f"{prefix}-{ns}-{next(_order_seq)}"
+    created_at = datetime.fromtimestamp(ns / 1e9).isoformat()
+    return order_id, created_at
 
 
 # ----------------------------
 # Basic Endpoints
 # ----------------------------
 
+# No logging on these: health probes hit them constantly, and every
+# record would also be serialized and queued for Application Insights.
 @app.get("/")
 def root():
-    logger.info("Root endpoint called")
     return {"message": "Order Service is running"}
 
 
 @app.get("/health")
 def health():
-    logger.info("Health check called")
     return {"status": "healthy", "service": "order-service"}
 
 
@@ -102,8 +119,7 @@ def create_order(order_data: OrderCreate):
     """
     Simple order creation (no external checks).
     """
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    order_id = f"ORD-{timestamp}"
+    order_id, created_at = new_order_id()
 
     logger.info(
         "Creating simple order %s for customer=%s, product=%s, quantity=%s",
@@ -117,14 +133,14 @@ def create_order(order_data: OrderCreate):
         quantity=order_data.quantity,
         delivery_address=order_data.delivery_address,
         status="CREATED",
-        created_at=datetime.now().isoformat()
+        created_at=created_at
     )
 
-    orders_db[order_id] = new_order
+    orders_db[order_id] = new_order.model_dump()
     return new_order
 
 
-@app.get("/orders/{order_id}", response_model=Order)
+@app.get("/orders/{order_id}", response_model=None)
 def get_order(order_id: str):
     """
     Get a single order by ID.
@@ -142,7 +158,8 @@ def list_orders():
     """
     List all orders.
     """
-    logger.info("Listing all orders, total=%s", len(orders_db))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Listing all orders, total=%s", len(orders_db))
     return {
         "total": len(orders_db),
         "orders": list(orders_db.values())
@@ -153,6 +170,11 @@ def list_orders():
 # Simulated External Services
 # ----------------------------
 
+# Dedicated RNG instance so stress tests don't contend on the lock of the
+# shared module-level generator in `random`.
+_rng = random.Random()
+
+
 def simulate_inventory_check(product_id: str, quantity: int):
     """
     Simulate calling an Inventory Service.
@@ -160,7 +182,7 @@ def simulate_inventory_check(product_id: str, quantity: int):
     """
     logger.info("Checking inventory for product=%s quantity=%s", product_id, quantity)
 
-    r = random.random()
+    r = _rng.random()
 
     # 20% chance: inventory service down
     if r < 0.2:
@@ -184,14 +206,14 @@ def simulate_courier_assignment(order_id: str, address: str):
     """
     logger.info("Assigning courier for order=%s to address=%s", order_id, address)
 
-    r = random.random()
+    r = _rng.random()
 
     # 15% chance: courier API timeout
     if r < 0.15:
         logger.error("Courier API timeout for order=%s", order_id)
         raise HTTPException(status_code=504, detail="Courier service timeout")
 
-    courier_id = f"COURIER-{random.randint(100, 999)}"
+    courier_id = f"COURIER-{_rng.randrange(100, 1000)}"
     logger.info("Courier %s assigned to order %s", courier_id, order_id)
 
     return {"courier_id": courier_id, "status": "assigned"}
@@ -213,8 +235,7 @@ def process_order(order_data: OrderCreate):
     - Insufficient stock
     - Courier timeout
     """
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    order_id = f"ORD-PROC-{timestamp}"
+    order_id, created_at = new_order_id("ORD-PROC")
 
     logger.info(
         "Processing order %s for customer=%s, product=%s, quantity=%s",
@@ -236,10 +257,10 @@ def process_order(order_data: OrderCreate):
             quantity=order_data.quantity,
             delivery_address=order_data.delivery_address,
             status="CONFIRMED",
-            created_at=datetime.now().isoformat()
+            created_at=created_at
         )
 
-        orders_db[order_id] = new_order
+        orders_db[order_id] = new_order.model_dump()
 
         logger.info("Order %s processed successfully (CONFIRMED)", order_id)
         return new_order
@@ -1,20 +1,95 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
 from typing import List, Dict, Any
 
+import anyio.to_thread
+import orjson
 from fastapi import FastAPI, HTTPException
-from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 
 from engine import (
-    load_logs,
-    build_incidents,
-    get_incident_by_order_id,
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    LOG_FILE,
+    build_incident_index,
+    build_incidents_from_csv,
     generate_postmortem_gemini,
+    incident_content_hash,
 )
 
+# Postmortems are cached on disk by incident content hash, so identical
+# incident payloads never hit Gemini twice (even across restarts).
+PM_CACHE_DIR = Path(".pm_cache")
+
+# How often the background task checks the log file for changes.
+LOG_POLL_SECONDS = 30
+
+# Incident cache, built once at startup and refreshed by the watcher task
+# when the log file's mtime changes. The request path never touches disk.
+_cache_mtime_ns: int | None = None
+_cached_incidents: List[Dict[str, Any]] | None = None
+_cached_index: Dict[str, Dict[str, Any]] = {}
+_cached_summary_json: bytes | None = None
+
+
+def _refresh_incidents() -> None:
+    global _cache_mtime_ns, _cached_incidents, _cached_index, _cached_summary_json
+
+    if not LOG_FILE.exists():
+        return
+
+    mtime_ns = LOG_FILE.stat().st_mtime_ns
+    if mtime_ns == _cache_mtime_ns:
+        return
+
+    # Streaming builder: one pass over the CSV, no DataFrame in between.
+    incidents = build_incidents_from_csv()
+    if incidents is None:
+        return
+    _cached_incidents = incidents
+    _cached_index = build_incident_index(incidents)
+
+    # The summary only changes on refresh, so serialize it once here and
+    # let /incidents return the finished bytes.
+    summary = [
+        {
+            "order_id": inc["order_id"],
+            "status": inc["status"],
+            "start_time": str(inc["start_time"]),
+            "end_time": str(inc["end_time"]),
+            "duration_seconds": inc["duration_seconds"],
+            "failure_detail": inc["failure_detail"],
+            "event_count": inc["event_count"],
+        }
+        for inc in incidents
+    ]
+    _cached_summary_json = orjson.dumps(summary)
+    _cache_mtime_ns = mtime_ns
+
+
+async def _watch_log_file() -> None:
+    while True:
+        await asyncio.sleep(LOG_POLL_SECONDS)
+        await anyio.to_thread.run_sync(_refresh_incidents)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await anyio.to_thread.run_sync(_refresh_incidents)
+    watcher = asyncio.create_task(_watch_log_file())
+    yield
+    watcher.cancel()
+
+
 app = FastAPI(
     title="Postmortem Engine API",
     description="AI-assisted incident and post-mortem service for Smart Logistics",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +105,34 @@ app.add_middleware(
 )
 
 
-def _load_incident_data() -> List[Dict[str, Any]]:
-    df = load_logs()
-    if df is None:
+def _get_incidents() -> List[Dict[str, Any]]:
+    if _cached_incidents is None:
         raise HTTPException(status_code=500, detail="Log file not found or unreadable")
-    return build_incidents(df)
+    return _cached_incidents
+
+
+def _lookup_incident(order_id: str) -> Dict[str, Any] | None:
+    _get_incidents()
+    return _cached_index.get(order_id)
+
+
+def _generate_postmortem_cached(inc: Dict[str, Any]) -> str:
+    if not GEMINI_API_KEY:
+        # Without a key the engine returns its disabled sentinel; keep it
+        # out of the persistent cache or it would still be served after a
+        # key is configured.
+        return generate_postmortem_gemini(inc)
+
+    key = incident_content_hash(inc)
+    cache_file = PM_CACHE_DIR / f"{GEMINI_MODEL}-{key}.json"
+
+    if cache_file.exists():
+        return json.loads(cache_file.read_text())["postmortem"]
+
+    report = generate_postmortem_gemini(inc)
+    PM_CACHE_DIR.mkdir(exist_ok=True)
+    cache_file.write_text(json.dumps({"postmortem": report}))
+    return report
 
 @app.get("/")
 def root():
@@ -49,50 +147,40 @@ def root():
     }
 
 @app.get("/incidents")
-def list_incidents():
+async def list_incidents():
     """
     Return a summary list of all incidents (per order_id).
     """
-    incidents = _load_incident_data()
-    # Only summary fields for the list
-    summary = [
-        {
-            "order_id": inc["order_id"],
-            "status": inc["status"],
-            "start_time": str(inc["start_time"]),
-            "end_time": str(inc["end_time"]),
-            "duration_seconds": inc["duration_seconds"],
-            "failure_detail": inc["failure_detail"],
-            "event_count": inc["event_count"],
-        }
-        for inc in incidents
-    ]
-    return jsonable_encoder(summary)
+    if _cached_summary_json is None:
+        raise HTTPException(status_code=500, detail="Log file not found or unreadable")
+    # Pre-serialized at refresh time; this is just a socket write.
+    return Response(_cached_summary_json, media_type="application/json")
 
 
 @app.get("/incidents/{order_id}")
-def get_incident(order_id: str):
+async def get_incident(order_id: str):
     """
     Return full incident details for a specific order_id.
     """
-    incidents = _load_incident_data()
-    inc = get_incident_by_order_id(incidents, order_id)
+    inc = _lookup_incident(order_id)
     if not inc:
         raise HTTPException(status_code=404, detail="Incident not found")
-    return jsonable_encoder(inc)
+    # orjson serializes datetimes natively; no jsonable_encoder pass needed
+    return inc
 
 
 @app.get("/incidents/{order_id}/postmortem")
-def get_postmortem(order_id: str):
+async def get_postmortem(order_id: str):
     """
     Generate a post-mortem report for a specific incident using Gemini.
     """
-    incidents = _load_incident_data()
-    inc = get_incident_by_order_id(incidents, order_id)
+    inc = _lookup_incident(order_id)
     if not inc:
         raise HTTPException(status_code=404, detail="Incident not found")
 
-    report = generate_postmortem_gemini(inc)
+    # Gemini calls take seconds; keep them off the event loop so other
+    # requests are not blocked behind a single report.
+    report = await anyio.to_thread.run_sync(_generate_postmortem_cached, inc)
     return {
         "order_id": order_id,
         "status": inc["status"],
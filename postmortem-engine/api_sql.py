@@ -1,14 +1,18 @@
-import json
+from datetime import datetime
 from typing import List, Dict, Any
 
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+import orjson
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
 
-from db_sql import SessionLocal
-from repo_sql import upsert_incident, list_incidents, get_incident, upsert_postmortem, kpis, get_postmortem
+from db_sql import get_db
+from repo_sql import upsert_incidents_bulk, list_incidents, get_incident, upsert_postmortem, kpis, get_postmortem, decode_messages
 
 # reuse your existing CSV+Gemini logic
-from engine import load_logs, build_incidents, generate_postmortem_gemini, GEMINI_MODEL
+from engine import load_logs, build_incidents, generate_postmortem_gemini, incident_content_hash, GEMINI_MODEL
 
 app = FastAPI(
     title="Postmortem Engine API (Azure SQL)",
@@ -29,45 +33,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Serialized /kpis body, rebuilt lazily and dropped whenever /refresh
+# changes the underlying incidents.
+_kpis_json: bytes | None = None
+
+
 @app.post("/refresh")
-def refresh_from_csv():
+async def refresh_from_csv(db: Session = Depends(get_db)):
     """
     Read logs_sample.csv -> build incidents -> upsert into Azure SQL.
     """
-    df = load_logs()
+    global _kpis_json
+    df = await anyio.to_thread.run_sync(load_logs)
     if df is None:
         raise HTTPException(status_code=500, detail="logs_sample.csv not found")
 
-    incidents = build_incidents(df)
+    incidents = await anyio.to_thread.run_sync(build_incidents, df)
 
-    db = SessionLocal()
-    try:
+    def _persist():
+        rows = []
         for inc in incidents:
             # Convert timestamps to Python datetime for SQL DateTime columns
             inc_for_db = dict(inc)
             inc_for_db["start_time"] = inc["start_time"].to_pydatetime() if hasattr(inc["start_time"], "to_pydatetime") else inc["start_time"]
             inc_for_db["end_time"] = inc["end_time"].to_pydatetime() if hasattr(inc["end_time"], "to_pydatetime") else inc["end_time"]
+            rows.append(inc_for_db)
 
-            upsert_incident(db, inc_for_db, source="csv")
+        upsert_incidents_bulk(db, rows, source="csv")
         db.commit()
-    finally:
-        db.close()
+
+    await anyio.to_thread.run_sync(_persist)
+    _kpis_json = None
 
     return {"refreshed": len(incidents)}
 
 @app.get("/kpis")
-def get_kpis():
-    db = SessionLocal()
-    try:
-        return kpis(db)
-    finally:
-        db.close()
+async def get_kpis(db: Session = Depends(get_db)):
+    global _kpis_json
+    if _kpis_json is None:
+        _kpis_json = orjson.dumps(await anyio.to_thread.run_sync(kpis, db))
+    return Response(_kpis_json, media_type="application/json")
 
 @app.get("/incidents")
-def api_list_incidents(status: str | None = None, search: str | None = None):
-    db = SessionLocal()
-    try:
-        rows = list_incidents(db, status=status, search=search)
+async def api_list_incidents(status: str | None = None, search: str | None = None,
+                             limit: int = 100, before: datetime | None = None,
+                             db: Session = Depends(get_db)):
+    def _work():
+        rows = list_incidents(db, status=status, search=search, limit=limit, before=before)
         return [
             {
                 "order_id": r.order_id,
@@ -81,13 +93,12 @@ def api_list_incidents(status: str | None = None, search: str | None = None):
             }
             for r in rows
         ]
-    finally:
-        db.close()
+
+    return await anyio.to_thread.run_sync(_work)
 
 @app.get("/incidents/{order_id}")
-def api_get_incident(order_id: str):
-    db = SessionLocal()
-    try:
+async def api_get_incident(order_id: str, db: Session = Depends(get_db)):
+    def _work():
         r = get_incident(db, order_id)
         if not r:
             raise HTTPException(status_code=404, detail="Incident not found")
@@ -100,27 +111,20 @@ def api_get_incident(order_id: str):
             "failure_detail": r.failure_detail,
             "event_count": r.event_count,
             "source": r.source,
-            "messages": json.loads(r.raw_messages),
+            "messages": decode_messages(r.raw_messages),
         }
-    finally:
-        db.close()
+
+    return await anyio.to_thread.run_sync(_work)
 
 @app.get("/incidents/{order_id}/postmortem")
-def api_get_postmortem(order_id: str, regenerate: bool = False):
+async def api_get_postmortem(order_id: str, regenerate: bool = False, db: Session = Depends(get_db)):
     model_name = GEMINI_MODEL
 
-    db = SessionLocal()
-    try:
+    def _work():
         inc = get_incident(db, order_id)
         if not inc:
             raise HTTPException(status_code=404, detail="Incident not found")
 
-        if not regenerate:
-            cached = get_postmortem(db, order_id, model_name)
-            if cached:
-                return {"order_id": order_id, "model": model_name, "cached": True, "postmortem": cached.report_text}
-
-        # generate fresh
         inc_dict = {
             "order_id": inc.order_id,
             "status": inc.status,
@@ -129,15 +133,25 @@ def api_get_postmortem(order_id: str, regenerate: bool = False):
             "duration_seconds": inc.duration_seconds,
             "failure_detail": inc.failure_detail,
             "event_count": inc.event_count,
-            "messages": json.loads(inc.raw_messages),
+            "messages": decode_messages(inc.raw_messages),
         }
+        content_hash = incident_content_hash(inc_dict)
+
+        if not regenerate:
+            cached = get_postmortem(db, order_id, model_name)
+            # Only reuse the cached report while the incident payload is
+            # unchanged; an edited incident regenerates automatically.
+            if cached and cached.content_hash == content_hash:
+                return {"order_id": order_id, "model": model_name, "cached": True, "postmortem": cached.report_text}
+
+        # generate fresh (blocking Gemini call, runs on the worker thread)
         report = generate_postmortem_gemini(inc_dict)
-        upsert_postmortem(db, order_id, model_name, report)
+        upsert_postmortem(db, order_id, model_name, report, content_hash=content_hash)
         db.commit()
 
         return {"order_id": order_id, "model": model_name, "cached": False, "postmortem": report}
-    finally:
-        db.close()
+
+    return await anyio.to_thread.run_sync(_work)
 
 if __name__ == "__main__":
     import uvicorn
@@ -28,7 +28,26 @@ def build_engine():
     )
 
     url = "mssql+pyodbc:///?odbc_connect=" + quote_plus(odbc)
-    return create_engine(url, pool_pre_ping=True)
+    # Azure SQL logins are expensive (TLS + TDS handshake), so keep a
+    # generous warm pool instead of the default 5 connections.
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=20,
+        max_overflow=40,
+        pool_recycle=1800,
+        pool_reset_on_return="rollback",
+        fast_executemany=True,
+    )
 
 engine = build_engine()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_db():
+    """FastAPI dependency: yield a pooled session and always close it."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
\ No newline at end of file
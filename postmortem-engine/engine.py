@@ -1,34 +1,140 @@
+import asyncio
+import csv
+import hashlib
+import json
 import os
 import re
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 import google.generativeai as genai
+
+try:
+    import hyperscan  # optional; SIMD regex for very large log exports
+except ImportError:
+    hyperscan = None
 # core logic (load logs, build incidents, call Gemini)
 # ---------------- CONFIG ----------------
 LOG_FILE = Path("logs_sample.csv")
 ORDER_ID_REGEX = re.compile(r"(ORD-(?:PROC-)?\d+)")
 
+# Prepared-DataFrame cache; file names embed size + mtime of the CSV so
+# a changed export simply misses and a fresh parquet is written.
+CACHE_DIR = Path(".cache")
+
+# Below this size the pandas str.extract path wins; the hyperscan setup
+# (buffer join + offset mapping) only pays off on big exports.
+HYPERSCAN_MIN_BYTES = 100 * 1024 * 1024
+
+_hs_db = None
+
+# Known failure signatures from the order service, matched in one C-level
+# regex scan and dispatched through a dict instead of chained `in` checks.
+_CAUSE_RE = re.compile(
+    r"(inventory service unavailable|insufficient stock|courier (?:service|api) timeout)"
+)
+_CAUSE_LABELS = {
+    "inventory service unavailable": "Inventory service outage",
+    "insufficient stock": "Insufficient stock",
+    "courier service timeout": "Courier timeout",
+    "courier api timeout": "Courier timeout",
+}
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
 
+# Static instructions go first (and as the system segment) so provider
+# prompt caches, which match on exact prefixes, hit across a batch of
+# incidents; only the incident JSON varies per call.
+SRE_PROMPT_PREFIX = """You are a senior SRE/DevOps engineer helping write incident post-mortem reports
+for a smart logistics platform running on Microsoft Azure.
+
+You will be given structured incident data as JSON.
+
+Generate a detailed post-mortem with these sections:
+
+1. Executive Summary (2–4 sentences, non-technical, for managers)
+2. Impact
+3. Technical Root Cause
+4. Timeline of Events (bulleted, chronological)
+5. Contributing Factors
+6. Corrective and Preventive Actions (3–6 concrete items, each with priority P0/P1/P2)
+7. Lessons Learned (3 key points)
+
+Keep it focused on this single incident."""
+
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
+    # One model instance for the process; constructing it repeats
+    # config/auth setup we only need once.
+    _MODEL = genai.GenerativeModel(GEMINI_MODEL, system_instruction=SRE_PROMPT_PREFIX)
 else:
     print("[WARN] GEMINI_API_KEY not set. LLM-based reports will be disabled.")
+    _MODEL = None
 
 
 # ------------- CORE FUNCTIONS ------------
 
-def extract_order_id(message: str):
-    """Extract order id like ORD-... or ORD-PROC-... from log message."""
-    if not isinstance(message, str):
-        return None
-    m = ORDER_ID_REGEX.search(message)
-    return m.group(1) if m else None
+def _get_hyperscan_db():
+    global _hs_db
+    if _hs_db is None:
+        _hs_db = hyperscan.Database()
+        _hs_db.compile(
+            expressions=[rb"ORD-(?:PROC-)?\d+"],
+            ids=[1],
+            flags=[hyperscan.HS_FLAG_SOM_LEFTMOST],
+        )
+    return _hs_db
+
+
+def _extract_order_ids_hyperscan(messages: pd.Series) -> pd.Series:
+    """
+    Extract order ids with hyperscan's SIMD-compiled DFA.
+
+    Messages are joined into one NUL-separated buffer and scanned in a
+    single pass; match offsets map back to rows via a prefix-sum search.
+    Only worth it on very large exports — see HYPERSCAN_MIN_BYTES.
+    """
+    parts = [v.encode("utf-8", "replace") for v in messages.fillna("")]
+    buf = b"\x00".join(parts)
+    # start offset of each row inside buf (+1 per NUL separator)
+    offsets = np.cumsum([0] + [len(p) + 1 for p in parts[:-1]])
+
+    # Hyperscan fires the callback at every end offset of an unbounded
+    # \d+ (ORD-1, ORD-17, ...), so keep the leftmost start per row and,
+    # for that start, the largest end — re.search's leftmost-longest.
+    starts: List[int | None] = [None] * len(parts)
+    ends: List[int] = [0] * len(parts)
+
+    def on_match(_id, start, end, _flags, _ctx):
+        row = int(np.searchsorted(offsets, start, side="right")) - 1
+        if starts[row] is None or start < starts[row]:
+            starts[row], ends[row] = start, end
+        elif start == starts[row] and end > ends[row]:
+            ends[row] = end
+
+    _get_hyperscan_db().scan(buf, match_event_handler=on_match)
+
+    out = [
+        buf[s:e].decode() if s is not None else None
+        for s, e in zip(starts, ends)
+    ]
+    result = pd.Series(out, index=messages.index, dtype="string")
+
+    # Parity check on a sample: if hyperscan disagrees with the regex
+    # engine here, distrust the whole pass rather than corrupt grouping.
+    sample = messages.head(1000)
+    expected = sample.str.extract(ORDER_ID_REGEX, expand=False).astype("string")
+    if not result.head(len(sample)).equals(expected):
+        print("[WARN] hyperscan extraction mismatch; falling back to str.extract")
+        return messages.str.extract(ORDER_ID_REGEX, expand=False)
+
+    return result
 
 
 def load_logs() -> pd.DataFrame | None:
@@ -37,112 +143,293 @@ def load_logs() -> pd.DataFrame | None:
         print(f"[ERROR] Log file not found: {LOG_FILE.resolve()}")
         return None
 
-    df = pd.read_csv(LOG_FILE)
+    # Warm starts skip the CSV parse entirely: the prepared frame is
+    # cached as parquet, which loads ~10x faster and preserves dtypes.
+    st = LOG_FILE.stat()
+    cache = CACHE_DIR / f"logs-{st.st_size}-{st.st_mtime_ns}.parquet"
+    if cache.exists():
+        return pd.read_parquet(cache)
+
+    # PyArrow parses the CSV in parallel and skips dtype inference; only
+    # the three columns we actually use are loaded.
+    df = pd.read_csv(
+        LOG_FILE,
+        engine="pyarrow",
+        usecols=["timestamp [UTC]", "message", "severityLevel"],
+        # Int16 is nullable, so blank severity cells survive the read and
+        # are handled by the fillna below.
+        dtype={"message": "string", "severityLevel": "Int16"},
+    )
 
-    if "timestamp [UTC]" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp [UTC]"])
+    df["timestamp"] = pd.to_datetime(df["timestamp [UTC]"], format="ISO8601", cache=True)
+    df["severityLevel"] = df["severityLevel"].fillna(0).astype(int)
+    if hyperscan is not None and st.st_size > HYPERSCAN_MIN_BYTES:
+        df["order_id"] = _extract_order_ids_hyperscan(df["message"])
     else:
-        df["timestamp"] = pd.to_datetime(df.index)
+        # One vectorized regex pass over the column; the nullable string
+        # dtype set at read time keeps NA handling out of Python.
+        df["order_id"] = df["message"].str.extract(ORDER_ID_REGEX, expand=False)
 
-    df["message"] = df["message"].astype(str)
-    df["severityLevel"] = df["severityLevel"].fillna(0).astype(int)
-    df["order_id"] = df["message"].apply(extract_order_id)
+    # Thousands of repeated short ids: category stores each unique value
+    # once and lets the groupby in build_incidents key on integer codes.
+    df["order_id"] = df["order_id"].astype("category")
 
     df = df.sort_values("timestamp").reset_index(drop=True)
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    # Drop parquets for older versions of the CSV before writing ours.
+    for stale in CACHE_DIR.glob("logs-*.parquet"):
+        stale.unlink(missing_ok=True)
+    df.to_parquet(cache, compression="zstd")
     return df
 
 
+def classify_root_cause(failure_detail: str | None) -> str | None:
+    """Map a failure detail string to a coarse root-cause bucket."""
+    if not failure_detail:
+        return None
+    m = _CAUSE_RE.search(failure_detail.lower())
+    return _CAUSE_LABELS[m.group(1)] if m else "Unknown"
+
+
 def build_incidents(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Turn rows into incident objects grouped by order_id.
+
+    Aggregation happens in a single groupby().agg() pass so pandas does
+    the reductions in C instead of a Python loop per order.
     """
-    df_orders = df[df["order_id"].notna()].copy()
+    mask = df["order_id"].notna()
+    if not mask.any():
+        # Bail out before paying for the row copy below.
+        return []
+
+    # sort_values already returns a fresh frame, no defensive .copy() needed
+    df_orders = df.loc[mask].sort_values("timestamp")
+    df_orders["is_err"] = df_orders["severityLevel"] >= 3
+
+    g = df_orders.groupby("order_id", sort=False, observed=True)
+    summary = g.agg(
+        start_time=("timestamp", "min"),
+        end_time=("timestamp", "max"),
+        has_error=("is_err", "any"),
+        event_count=("timestamp", "size"),
+    )
+    summary["duration_seconds"] = (
+        summary["end_time"] - summary["start_time"]
+    ).dt.total_seconds()
+    summary["status"] = pd.Categorical(
+        np.where(summary["has_error"], "FAILED", "SUCCESS")
+    )
+
+    messages = g["message"].apply(list)
+    # Last error message per order, used for failure_detail below.
+    last_err = df_orders[df_orders["is_err"]].groupby("order_id", sort=False, observed=True)["message"].last()
+
     incidents: List[Dict[str, Any]] = []
+    for order_id, row in summary.iterrows():
+        failure_detail = None
+        if row["has_error"]:
+            last_error_msg = last_err[order_id]
+            # rpartition is a plain C substring scan; no regex machinery
+            # needed for the fixed "detail=" log format.
+            _, sep, tail = last_error_msg.rpartition("detail=")
+            failure_detail = tail.strip() if sep else last_error_msg
+
+        incidents.append(
+            {
+                "order_id": order_id,
+                "status": str(row["status"]),
+                "start_time": row["start_time"],
+                "end_time": row["end_time"],
+                "duration_seconds": row["duration_seconds"],
+                "event_count": int(row["event_count"]),
+                "failure_detail": failure_detail,
+                "root_cause": classify_root_cause(failure_detail),
+                "messages": messages[order_id],
+            }
+        )
 
-    for order_id, group in df_orders.groupby("order_id"):
-        group = group.sort_values("timestamp")
+    return incidents
 
-        has_error = (group["severityLevel"] >= 3).any()
-        status = "FAILED" if has_error else "SUCCESS"
 
-        start_time = group["timestamp"].min()
-        end_time = group["timestamp"].max()
-        duration = (end_time - start_time).total_seconds()
+def build_incidents_from_csv(path: Path = LOG_FILE) -> List[Dict[str, Any]] | None:
+    """
+    Single-pass alternative to load_logs() + build_incidents().
+
+    Streams the CSV with csv.DictReader, keeping one accumulator per
+    order instead of materializing a full DataFrame and reshaping it
+    again. Memory stays O(orders) rather than O(rows), which matters
+    once log exports grow past what fits comfortably in RAM.
+    """
+    if not path.exists():
+        print(f"[ERROR] Log file not found: {path.resolve()}")
+        return None
+
+    # order_id -> list of (timestamp, message, severity)
+    events: Dict[str, List[tuple]] = {}
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            message = row.get("message") or ""
+            # Cheap C-level substring test first: most log lines carry no
+            # order id, so the regex engine never starts for them.
+            if "ORD-" not in message:
+                continue
+            m = ORDER_ID_REGEX.search(message)
+            if not m:
+                continue
+
+            ts_raw = row.get("timestamp [UTC]")
+            try:
+                ts = datetime.fromisoformat(ts_raw) if ts_raw else None
+            except ValueError:
+                ts = None
+
+            try:
+                severity = int(float(row.get("severityLevel") or 0))
+            except ValueError:
+                severity = 0
+
+            events.setdefault(m.group(1), []).append((ts, message, severity))
+
+    incidents: List[Dict[str, Any]] = []
+    for order_id, rows in events.items():
+        rows.sort(key=lambda e: e[0] or datetime.min)
+
+        timestamps = [ts for ts, _, _ in rows if ts is not None]
+        start_time = min(timestamps) if timestamps else None
+        end_time = max(timestamps) if timestamps else None
+        duration = (end_time - start_time).total_seconds() if timestamps else 0.0
+
+        last_err = None
+        for _, message, severity in rows:
+            if severity >= 3:
+                last_err = message
 
-        error_rows = group[group["severityLevel"] >= 3]
         failure_detail = None
-        if not error_rows.empty:
-            last_error_msg = error_rows.iloc[-1]["message"]
-            m = re.search(r"detail=(.*)", last_error_msg)
-            failure_detail = m.group(1).strip() if m else last_error_msg
+        if last_err is not None:
+            _, sep, tail = last_err.rpartition("detail=")
+            failure_detail = tail.strip() if sep else last_err
 
         incidents.append(
             {
                 "order_id": order_id,
-                "status": status,
+                "status": "FAILED" if last_err is not None else "SUCCESS",
                 "start_time": start_time,
                 "end_time": end_time,
                 "duration_seconds": duration,
-                "event_count": len(group),
+                "event_count": len(rows),
                 "failure_detail": failure_detail,
-                "messages": list(group["message"]),
+                "root_cause": classify_root_cause(failure_detail),
+                "messages": [message for _, message, _ in rows],
             }
         )
 
+    incidents.sort(key=lambda inc: inc["start_time"] or datetime.min)
     return incidents
 
 
-def get_incident_by_order_id(incidents: List[Dict[str, Any]], order_id: str) -> Dict[str, Any] | None:
-    """Find a single incident by order_id."""
+def build_incident_index(incidents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Index incidents by order_id for O(1) lookups.
+
+    Build this once per incident list when doing repeated lookups; a
+    linear scan per lookup degrades to O(N^2) over a batch.
+    """
+    return {inc["order_id"]: inc for inc in incidents}
+
+
+def get_incident_by_order_id(
+    incidents: List[Dict[str, Any]],
+    order_id: str,
+    index: Dict[str, Dict[str, Any]] | None = None,
+) -> Dict[str, Any] | None:
+    """Find a single incident by order_id.
+
+    Pass an index from build_incident_index to make the lookup O(1);
+    without one this falls back to a linear scan, fine for one-offs.
+    """
+    if index is not None:
+        return index.get(order_id)
     for inc in incidents:
         if inc["order_id"] == order_id:
             return inc
     return None
 
 
-def generate_postmortem_gemini(inc: Dict[str, Any]) -> str:
-    """
-    Use Gemini to generate a post-mortem report text for one incident.
+# Bump when the postmortem prompt changes so cached reports generated
+# from the old prompt are regenerated rather than reused.
+PROMPT_VERSION = "v2"
+
+
+def incident_content_hash(inc: Dict[str, Any]) -> str:
+    """Stable hash of an incident payload, used to key postmortem caches.
+
+    The prompt version is part of the hash, so both the on-disk cache and
+    the postmortems.content_hash column miss automatically when the
+    prompt template changes.
     """
-    if not GEMINI_API_KEY:
-        return "[LLM DISABLED] GEMINI_API_KEY not configured."
+    payload = PROMPT_VERSION + json.dumps(inc, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
 
-    import json
 
+def _build_prompt(inc: Dict[str, Any]) -> str:
+    # Compact separators: indenting the JSON only inflated the prompt
+    # (and input token count) without helping the model.
     incident_json = json.dumps(
         {
             "order_id": inc["order_id"],
             "status": inc["status"],
-            "start_time": str(inc["start_time"]),
-            "end_time": str(inc["end_time"]),
+            "start_time": inc["start_time"],
+            "end_time": inc["end_time"],
             "duration_seconds": inc["duration_seconds"],
             "failure_detail": inc["failure_detail"],
             "timeline": inc["messages"],
         },
-        indent=2,
+        default=str,
+        separators=(",", ":"),
     )
+    return f"INCIDENT_DATA:\n{incident_json}\n"
 
-    prompt = f"""
-You are a senior SRE/DevOps engineer helping write incident post-mortem reports
-for a smart logistics platform running on Microsoft Azure.
 
-Here is the structured incident data:
+def generate_postmortem_gemini(inc: Dict[str, Any]) -> str:
+    """
+    Use Gemini to generate a post-mortem report text for one incident.
+    """
+    if not GEMINI_API_KEY:
+        return "[LLM DISABLED] GEMINI_API_KEY not configured."
 
-{incident_json}
+    resp = _MODEL.generate_content(_build_prompt(inc))
+    return resp.text
 
-Generate a detailed post-mortem with these sections:
 
-1. Executive Summary (2–4 sentences, non-technical, for managers)
-2. Impact
-3. Technical Root Cause
-4. Timeline of Events (bulleted, chronological)
-5. Contributing Factors
-6. Corrective and Preventive Actions (3–6 concrete items, each with priority P0/P1/P2)
-7. Lessons Learned (3 key points)
+async def generate_postmortem_gemini_async(inc: Dict[str, Any]) -> str:
+    """Async variant of generate_postmortem_gemini using the SDK's non-blocking client."""
+    if not GEMINI_API_KEY:
+        return "[LLM DISABLED] GEMINI_API_KEY not configured."
+
+    resp = await _MODEL.generate_content_async(_build_prompt(inc))
+    return resp.text
+
+
+async def generate_postmortems_batch(incidents: List[Dict[str, Any]], concurrency: int = 8) -> list:
+    """
+    Generate reports for many incidents concurrently.
+
+    Each call is a 1-5s network round trip, so issuing them together
+    bounds wall time by the slowest call; the semaphore keeps the fan-out
+    within provider rate limits. Failures come back as exception objects
+    in the incident order (return_exceptions=True).
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def gen(inc):
+        async with sem:
+            return await generate_postmortem_gemini_async(inc)
+
+    return await asyncio.gather(*(gen(inc) for inc in incidents), return_exceptions=True)
 
-Keep it focused on this single incident.
-""".strip()
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    resp = model.generate_content(prompt)
-    return resp.text
\ No newline at end of file
+def generate_postmortems(incidents: List[Dict[str, Any]], concurrency: int = 8) -> list:
+    """Sync entrypoint for generate_postmortems_batch."""
+    return asyncio.run(generate_postmortems_batch(incidents, concurrency))
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""One-off schema migration for databases created before the gzip change.
+
+init_db_sql.py only creates missing tables (create_all never alters
+existing ones), so live databases need this script to catch up:
+
+ 1. incidents.raw_messages: plain-JSON NVARCHAR -> gzip VARBINARY(MAX),
+    back-filling existing rows in batches.
+ 2. postmortems.content_hash: added if missing.
+
+Safe to re-run: every step checks the current schema first, and an
+interrupted back-fill resumes where it stopped.
+"""
+import json
+
+from sqlalchemy import text
+
+from db_sql import engine
+from repo_sql import encode_messages
+
+BATCH = 500
+
+
+def _column_type(cn, table: str, column: str):
+    return cn.execute(
+        text(
+            "SELECT DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_NAME = :t AND COLUMN_NAME = :c"
+        ),
+        {"t": table, "c": column},
+    ).scalar()
+
+
+def migrate_raw_messages(cn):
+    if _column_type(cn, "incidents", "raw_messages") == "varbinary":
+        print("incidents.raw_messages already VARBINARY; skipping")
+        return
+
+    # Back-fill into a side column, then swap it in, so a crash mid-run
+    # never leaves the table without its data.
+    if _column_type(cn, "incidents", "raw_messages_bin") is None:
+        cn.execute(text("ALTER TABLE incidents ADD raw_messages_bin VARBINARY(MAX) NULL"))
+
+    migrated = 0
+    while True:
+        rows = cn.execute(
+            text(
+                "SELECT TOP (:n) id, raw_messages FROM incidents "
+                "WHERE raw_messages_bin IS NULL ORDER BY id"
+            ),
+            {"n": BATCH},
+        ).all()
+        if not rows:
+            break
+        for row_id, raw in rows:
+            blob = encode_messages(json.loads(raw) if raw else [])
+            cn.execute(
+                text("UPDATE incidents SET raw_messages_bin = :b WHERE id = :id"),
+                {"b": blob, "id": row_id},
+            )
+        migrated += len(rows)
+        print(f"  back-filled {migrated} rows")
+
+    cn.execute(text("ALTER TABLE incidents DROP COLUMN raw_messages"))
+    cn.execute(text("EXEC sp_rename 'incidents.raw_messages_bin', 'raw_messages', 'COLUMN'"))
+    cn.execute(text("ALTER TABLE incidents ALTER COLUMN raw_messages VARBINARY(MAX) NOT NULL"))
+    print(f"incidents.raw_messages migrated to gzip VARBINARY ({migrated} rows)")
+
+
+def migrate_content_hash(cn):
+    if _column_type(cn, "postmortems", "content_hash") is not None:
+        print("postmortems.content_hash already present; skipping")
+        return
+    # Left NULL for existing reports: the API treats a NULL hash as a
+    # cache miss and regenerates on next request.
+    cn.execute(text("ALTER TABLE postmortems ADD content_hash NVARCHAR(64) NULL"))
+    print("added postmortems.content_hash")
+
+
+with engine.begin() as cn:
+    migrate_raw_messages(cn)
+    migrate_content_hash(cn)
+print("Migration complete.")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, UniqueConstraint, Index
+from sqlalchemy import Column, Integer, String, Float, Text, LargeBinary, DateTime, UniqueConstraint, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from db_sql import Base
 
@@ -16,7 +17,11 @@ class Incident(Base):
     failure_detail = Column(String(2048), nullable=True)
     event_count = Column(Integer, nullable=False, default=0)
 
-    raw_messages = Column(Text, nullable=False)   # JSON string
+    # gzip-compressed JSON list; log lines are repetitive enough that this
+    # shrinks the largest column in the table ~5-10x. Use
+    # repo_sql.encode_messages / decode_messages to read and write it.
+    # Deferred: only fetched when a caller actually touches it.
+    raw_messages = deferred(Column(LargeBinary, nullable=False))
     source = Column(String(32), nullable=False, default="csv")
 
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -24,6 +29,8 @@ class Incident(Base):
     __table_args__ = (
         UniqueConstraint("order_id", name="uq_incidents_order_id"),
         Index("ix_incidents_status", "status"),
+        # Serves the paginated ORDER BY start_time DESC listing.
+        Index("ix_incidents_start_status", "start_time", "status"),
     )
 
 class Postmortem(Base):
@@ -33,6 +40,10 @@ class Postmortem(Base):
     order_id = Column(String(64), nullable=False)
     model_name = Column(String(128), nullable=False)
 
+    # Hash of the incident payload the report was generated from, so a
+    # cached report is only reused while the incident is unchanged.
+    content_hash = Column(String(64), nullable=True)
+
     report_text = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -1,10 +1,63 @@
+import gzip
 import json
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy import case, func, text
 from models_sql import Incident, Postmortem
 
+
+def encode_messages(messages: list) -> bytes:
+    """gzip-compressed JSON for the incidents.raw_messages column."""
+    return gzip.compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+def decode_messages(blob) -> list:
+    """Reverse of encode_messages; tolerates pre-migration rows."""
+    if isinstance(blob, str):
+        # Row from before migrate_db_sql.py ran (plain-JSON NVARCHAR).
+        return json.loads(blob)
+    try:
+        return json.loads(gzip.decompress(blob))
+    except OSError:
+        # Plain JSON bytes written before the gzip migration.
+        return json.loads(blob)
+
+_STAGE_DDL = """
+CREATE TABLE #stage (
+    order_id NVARCHAR(64) NOT NULL,
+    status NVARCHAR(16) NOT NULL,
+    start_time DATETIME2 NOT NULL,
+    end_time DATETIME2 NOT NULL,
+    duration_seconds FLOAT NOT NULL,
+    failure_detail NVARCHAR(2048) NULL,
+    event_count INT NOT NULL,
+    raw_messages VARBINARY(MAX) NOT NULL,
+    source NVARCHAR(32) NOT NULL
+)
+""".strip()
+
+_STAGE_MERGE = """
+MERGE incidents AS T
+USING #stage AS S
+ON T.order_id = S.order_id
+WHEN MATCHED THEN UPDATE SET
+    status = S.status,
+    start_time = S.start_time,
+    end_time = S.end_time,
+    duration_seconds = S.duration_seconds,
+    failure_detail = S.failure_detail,
+    event_count = S.event_count,
+    raw_messages = S.raw_messages,
+    source = S.source
+WHEN NOT MATCHED THEN INSERT
+    (order_id, status, start_time, end_time, duration_seconds,
+     failure_detail, event_count, raw_messages, source)
+    VALUES
+    (S.order_id, S.status, S.start_time, S.end_time, S.duration_seconds,
+     S.failure_detail, S.event_count, S.raw_messages, S.source);
+""".strip()
+
 def upsert_incident(db: Session, inc: dict, source: str = "csv"):
-    raw = json.dumps(inc.get("messages", []), ensure_ascii=False)
+    raw = encode_messages(inc.get("messages", []))
 
     existing = db.query(Incident).filter(Incident.order_id == inc["order_id"]).first()
     if existing:
@@ -31,16 +84,77 @@ def upsert_incident(db: Session, inc: dict, source: str = "csv"):
             )
         )
 
-def list_incidents(db: Session, status: str | None = None, search: str | None = None):
-    q = db.query(Incident)
+def upsert_incidents_bulk(db: Session, incidents: list[dict], source: str = "csv"):
+    """
+    Upsert many incidents via a #stage temp table and one server-side
+    MERGE, instead of a SELECT + UPDATE/INSERT pair per incident. The
+    staging insert uses pyodbc's fast_executemany, so the whole batch
+    costs a couple of round trips to Azure SQL regardless of size.
+    """
+    if not incidents:
+        return
+
+    rows = [
+        (
+            inc["order_id"],
+            inc["status"],
+            inc["start_time"],
+            inc["end_time"],
+            float(inc["duration_seconds"]),
+            inc.get("failure_detail"),
+            int(inc["event_count"]),
+            encode_messages(inc.get("messages", [])),
+            source,
+        )
+        for inc in incidents
+    ]
+
+    # Temp tables are connection-scoped, so drop to the raw pyodbc cursor.
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.fast_executemany = True
+        cursor.execute(_STAGE_DDL)
+        cursor.executemany(
+            "INSERT INTO #stage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        cursor.execute(_STAGE_MERGE)
+        cursor.execute("DROP TABLE #stage")
+    finally:
+        cursor.close()
+
+
+def list_incidents(db: Session, status: str | None = None, search: str | None = None,
+                   limit: int = 100, before=None):
+    # Explicit column projection: the raw_messages blob stays in SQL
+    # Server unless a caller asks for a single incident.
+    q = db.query(
+        Incident.order_id,
+        Incident.status,
+        Incident.start_time,
+        Incident.end_time,
+        Incident.duration_seconds,
+        Incident.failure_detail,
+        Incident.event_count,
+        Incident.source,
+    )
     if status:
         q = q.filter(Incident.status == status)
     if search:
         q = q.filter(Incident.order_id.contains(search))
-    return q.order_by(Incident.start_time.desc()).all()
+    if before is not None:
+        # Keyset pagination: pass the oldest start_time of the previous page.
+        q = q.filter(Incident.start_time < before)
+    return q.order_by(Incident.start_time.desc()).limit(limit).all()
 
 def get_incident(db: Session, order_id: str):
-    return db.query(Incident).filter(Incident.order_id == order_id).first()
+    # Single-incident callers always read the messages, so undefer the
+    # blob here and fetch the row in one query.
+    return (
+        db.query(Incident)
+        .options(undefer(Incident.raw_messages))
+        .filter(Incident.order_id == order_id)
+        .first()
+    )
 
 def get_postmortem(db: Session, order_id: str, model_name: str):
     return db.query(Postmortem).filter(
@@ -48,26 +162,51 @@ def get_postmortem(db: Session, order_id: str, model_name: str):
         Postmortem.model_name == model_name
     ).first()
 
-def upsert_postmortem(db: Session, order_id: str, model_name: str, text: str):
-    pm = get_postmortem(db, order_id, model_name)
-    if pm:
-        pm.report_text = text
-    else:
-        db.add(Postmortem(order_id=order_id, model_name=model_name, report_text=text))
+_PM_MERGE = text("""
+MERGE postmortems AS T
+USING (SELECT :order_id AS order_id, :model_name AS model_name) AS S
+ON T.order_id = S.order_id AND T.model_name = S.model_name
+WHEN MATCHED THEN UPDATE SET
+    report_text = :report_text,
+    content_hash = :content_hash
+WHEN NOT MATCHED THEN INSERT (order_id, model_name, content_hash, report_text)
+    VALUES (:order_id, :model_name, :content_hash, :report_text);
+""".strip())
 
-def kpis(db: Session):
-    total = db.query(func.count(Incident.id)).scalar() or 0
-    failed = db.query(func.count(Incident.id)).filter(Incident.status == "FAILED").scalar() or 0
 
-    top_failure = (
-        db.query(Incident.failure_detail, func.count(Incident.id).label("c"))
+def upsert_postmortem(db: Session, order_id: str, model_name: str, report_text: str, content_hash: str | None = None):
+    # Single MERGE instead of SELECT-then-write: one round trip, and no
+    # race between the existence check and the insert.
+    db.execute(
+        _PM_MERGE,
+        {
+            "order_id": order_id,
+            "model_name": model_name,
+            "report_text": report_text,
+            "content_hash": content_hash,
+        },
+    )
+
+def kpis(db: Session):
+    # One round trip: totals via conditional aggregation, top failure via
+    # a scalar subquery, instead of three separate table scans.
+    top_failure_sq = (
+        db.query(Incident.failure_detail)
         .filter(Incident.failure_detail.isnot(None))
         .group_by(Incident.failure_detail)
         .order_by(func.count(Incident.id).desc())
-        .first()
+        .limit(1)
+        .scalar_subquery()
     )
 
-    top_failure_detail = top_failure[0] if top_failure else None
+    total, failed, top_failure_detail = db.query(
+        func.count(Incident.id),
+        func.sum(case((Incident.status == "FAILED", 1), else_=0)),
+        top_failure_sq,
+    ).one()
+
+    total = total or 0
+    failed = int(failed or 0)
     failure_rate = (failed / total) if total else 0.0
 
     return {